@@ -4,10 +4,25 @@ import math
 import io
 import zipfile
 import json
-from flask import Flask, render_template, request, send_file, jsonify
+import threading
+import unicodedata
+import itertools
+from collections import Counter
+import multiprocessing
+from contextlib import contextmanager
+from typing import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import quote
+from flask import Flask, Response, render_template, request, jsonify
 import ezdxf
+from ezdxf.document import Drawing, CREATED_BY_EZDXF
+from ezdxf.tools import guid
+from ezdxf.tools.juliandate import juliandate
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from openpyxl import load_workbook
+from datetime import datetime, timezone
 
 app = Flask(__name__)
 
@@ -35,73 +50,186 @@ COLUMN_MAPPING = {
     'espessura': 'material_thickness',
 }
 
+# Valores aceitos como "verdadeiro" em caixas de seleção e colunas de opção
+_TRUTHY = frozenset({'true', 'on', '1', 'sim'})
+# Caracteres não permitidos em nomes de arquivo
+_FNAME_RE = re.compile(r'[^\w.-]+')
+# `engine='calamine'` só existe a partir do pandas 2.2; antes disso o `read_excel` rejeita o nome com ValueError
+_PANDAS_HAS_CALAMINE = tuple(int(part) for part in pd.__version__.split('.')[:2]) >= (2, 2)
+# Modelo DXF (R2000) de um retângulo sem texto nem cotas, capturado da saída do ezdxf
+with open(os.path.join(app.root_path, 'dxf_templates', 'rectangle.dxf.tpl'), encoding='utf-8') as _tpl_file:
+    _RECT_TPL = _tpl_file.read()
+
 #==============================================================================
 # FUNÇÃO DE DESENHO (LÓGICA PURA)
 #==============================================================================
-def create_dxf_drawing(params: dict):
+def _ezdxf_stamp() -> str:
+    """Marca de criação/escrita gravada pelo ezdxf nos metadados do documento."""
+    return f"{ezdxf.__version__} @ {datetime.now(tz=timezone.utc).isoformat()}"
+
+class DxfRenderer:
+    """
+    Mantém um documento DXF com as camadas e o estilo de cota já criados e o reaproveita entre peças,
+    evitando montar um `ezdxf.new` completo a cada desenho.
+    """
+    LAYERS = ('CONTORNO', 'FUROS', 'TEXTO', 'COTAS')
+
+    def __init__(self):
+        self.doc = ezdxf.new('R2000')
+        for name in self.LAYERS:
+            self.doc.layers.new(name)
+        self.dimstyle = self.doc.dimstyles.new('NOROACO_DIMSTYLE')
+        self.msp = self.doc.modelspace()
+        self._base_blocks = {block.name for block in self.doc.blocks}
+
+    @contextmanager
+    def drawing(self, styles: dict) -> Iterator[Drawing]:
+        """Aplica os estilos da peça e devolve o documento; ao sair, o modelspace volta a ficar vazio."""
+        self.doc.layers.get('CONTORNO').color = styles.get('contour_color', 7)
+        self.doc.layers.get('FUROS').color = styles.get('holes_color', 1)
+        self.doc.layers.get('TEXTO').color = styles.get('text_color', 2)
+        self.doc.layers.get('COTAS').color = styles.get('text_color', 2)
+        self.dimstyle.dxf.dimtxt = styles.get('char_height', 5)
+        # O `ezdxf.new` só define a identidade do documento uma vez; cada peça recebe a sua, como um documento novo
+        self.doc.header['$TDCREATE'] = juliandate(datetime.now())
+        self.doc.header['$FINGERPRINTGUID'] = guid()
+        self.doc.ezdxf_metadata()[CREATED_BY_EZDXF] = _ezdxf_stamp()
+        try:
+            yield self.doc
+        finally:
+            self._clear()
+
+    def write(self) -> bytes:
+        # Escreve direto em bytes, sem passar por uma string intermediária
+        buffer = io.BytesIO()
+        stream = io.TextIOWrapper(buffer, encoding='utf-8', newline='\n')
+        self.doc.write(stream)
+        stream.detach()
+        return buffer.getvalue()
+
+    def _clear(self):
+        self.msp.delete_all_entities()
+        # Blocos anônimos gerados pelas cotas (*D1, *D2, ...)
+        for name in [block.name for block in self.doc.blocks if block.name not in self._base_blocks]:
+            self.doc.blocks.delete_block(name, safe=False)
+        self.doc.entitydb.purge()
+
+# Um renderizador por thread (e, portanto, por processo do pool), já que o documento não é thread-safe
+_renderers = threading.local()
+
+def _get_renderer() -> DxfRenderer:
+    renderer = getattr(_renderers, 'renderer', None)
+    if renderer is None:
+        renderer = _renderers.renderer = DxfRenderer()
+    return renderer
+
+def _fast_rectangle_dxf(params: dict) -> bytes:
+    """
+    Gera o DXF de um retângulo simples a partir do modelo capturado do ezdxf (mesmas camadas e cabeçalho).
+    Datas, GUIDs e a marca do ezdxf são preenchidos a cada chamada, como no documento criado pelo ezdxf.
+    """
+    styles = params.get('styles', {})
+    return _RECT_TPL.format(
+        width=float(params['width']), height=float(params['height']),
+        contour_color=int(styles.get('contour_color', 7)), holes_color=int(styles.get('holes_color', 1)),
+        julian_date=juliandate(datetime.now()), fingerprint_guid=guid(), version_guid=guid(),
+        writer_stamp=_ezdxf_stamp(),
+    ).encode()
+
+def create_dxf_drawing(params: dict) -> tuple[bytes | None, str]:
     """Gera um desenho DXF a partir de um dicionário de parâmetros já validado e preparado."""
     try:
-        doc = ezdxf.new('R2000')
-        msp = doc.modelspace()
-        
         styles = params.get('styles', {})
-        doc.layers.new('CONTORNO', dxfattribs={'color': styles.get('contour_color', 7)})
-        doc.layers.new('FUROS', dxfattribs={'color': styles.get('holes_color', 1)})
-        
-        if params.get('text_lines'):
-            doc.layers.new('TEXTO', dxfattribs={'color': styles.get('text_color', 2)})
-            
-        if styles.get('include_dims', False):
-            doc.layers.new('COTAS', dxfattribs={'color': styles.get('text_color', 2)})
-            doc.dimstyles.new('NOROACO_DIMSTYLE', dxfattribs={'dimtxt': styles.get('char_height', 5)})
-            dim_attribs = {'layer': 'COTAS', 'dimstyle': 'NOROACO_DIMSTYLE'}
-
         shape_type = params.get('shape')
-        shape_creators = {
-            'rectangle': lambda m, p: m.add_lwpolyline([(0,0),(p['width'],0),(p['width'],p['height']),(0,p['height'])], close=True),
-        }
-        if shape_type in shape_creators:
-            shape_creators[shape_type](msp, params).dxf.layer = 'CONTORNO'
-        else:
-            return None, f"Forma '{shape_type}' desconhecida."
-
-        if params.get('text_lines'):
-            start_point = styles.get('text_insert_point', (0, -20))
-            char_height = styles.get('char_height', 5)
-            line_spacing = char_height * 1.5
-            for i, line in enumerate(params['text_lines']):
-                y_pos = start_point[1] - (i * line_spacing)
-                msp.add_text(
-                    line,
-                    dxfattribs={'layer': 'TEXTO', 'height': char_height, 'insert': (start_point[0], y_pos)}
-                )
-
-        if styles.get('include_dims'):
-            dim_distance = styles.get('dim_distance', 20)
-            dims_creators = {
-                'rectangle': lambda m, p: (
-                    m.add_aligned_dim(p1=(0, p['height']), p2=(p['width'], p['height']), distance=dim_distance, dxfattribs=dim_attribs).render(),
-                    m.add_aligned_dim(p1=(0, 0), p2=(0, p['height']), distance=-dim_distance, dxfattribs=dim_attribs).render()
-                ),
-            }
-            if shape_type in dims_creators:
-                dims_creators[shape_type](msp, params)
-
-        stream = io.StringIO()
-        doc.write(stream)
-        sanitized_filename = re.sub(r'[^\w.-]+', '_', str(params.get('part_name')))
-        return stream.getvalue(), f"{sanitized_filename}.dxf"
+        filename = f"{_FNAME_RE.sub('_', str(params.get('part_name')))}.dxf"
+
+        # Retângulo sem texto nem cotas: preenche o modelo pronto, sem montar o documento no ezdxf
+        if shape_type == 'rectangle' and not params.get('text_lines') and not styles.get('include_dims'):
+            return _fast_rectangle_dxf(params), filename
+
+        renderer = _get_renderer()
+        with renderer.drawing(styles) as doc:
+            msp = doc.modelspace()
+
+            if shape_type == 'rectangle':
+                width, height = params['width'], params['height']
+                msp.add_lwpolyline([(0, 0), (width, 0), (width, height), (0, height)], close=True, dxfattribs={'layer': 'CONTORNO'})
+            else:
+                return None, f"Forma '{shape_type}' desconhecida."
+
+            if params.get('text_lines'):
+                start_point = styles.get('text_insert_point', (0, -20))
+                char_height = styles.get('char_height', 5)
+                line_spacing = char_height * 1.5
+                for i, line in enumerate(params['text_lines']):
+                    y_pos = start_point[1] - (i * line_spacing)
+                    msp.add_text(
+                        line,
+                        dxfattribs={'layer': 'TEXTO', 'height': char_height, 'insert': (start_point[0], y_pos)}
+                    )
+
+            if styles.get('include_dims'):
+                dim_distance = styles.get('dim_distance', 20)
+                dim_attribs = {'layer': 'COTAS', 'dimstyle': 'NOROACO_DIMSTYLE'}
+                if shape_type == 'rectangle':
+                    msp.add_aligned_dim(p1=(0, height), p2=(width, height), distance=dim_distance, dxfattribs=dim_attribs).render()
+                    msp.add_aligned_dim(p1=(0, 0), p2=(0, height), distance=-dim_distance, dxfattribs=dim_attribs).render()
+
+            return renderer.write(), filename
 
     except KeyError as e:
         return None, f"Parâmetro obrigatório ausente para a forma '{shape_type}': {e}"
     except Exception as e:
-        app.logger.error(f"Erro inesperado no desenho do DXF: {e}")
-        return None, "Erro interno de desenho."
+        # Sem log aqui: no lote a falha entra no resumo de `_warn_batch`, e a rota de peça única registra a sua
+        return None, f"Erro interno de desenho: {e}"
+
+def _dedupe_rows(prepared_rows: list) -> tuple[list[dict], list[int]]:
+    """
+    Agrupa as linhas repetidas do lote (mesmos parâmetros) para desenhar cada peça uma única vez.
+    Retorna as linhas únicas, na ordem em que aparecem, e a posição de cada linha original entre elas.
+    """
+    unique_rows: list[dict] = []
+    slots: list[int] = []
+    positions: dict[str, int] = {}
+    for prepared in prepared_rows:
+        try:
+            key = json.dumps(prepared, sort_keys=True)
+        except TypeError:
+            # Parâmetros sem forma canônica: a linha é desenhada sozinha
+            key = None
+        if key is None or key not in positions:
+            if key is not None: positions[key] = len(unique_rows)
+            slots.append(len(unique_rows))
+            unique_rows.append(prepared)
+        else:
+            slots.append(positions[key])
+    return unique_rows, slots
+
+# Pool de processos compartilhado entre requisições, para não pagar a criação dos processos a cada lote
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # `forkserver`: o pool é criado a partir de uma thread de requisição, e `fork` de um processo
+            # com várias threads pode herdar travas presas por outras threads
+            _executor = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('forkserver'))
+        return _executor
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """Descarta um pool quebrado (processo filho morto) para que a próxima requisição crie outro."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
 
 #==============================================================================
 # FUNÇÃO CENTRAL DE PREPARAÇÃO E VALIDAÇÃO DE DADOS
 #==============================================================================
-def _prepare_data_for_dxf(raw_data: dict):
+def _prepare_data_for_dxf(raw_data: dict) -> tuple[dict | None, str | None]:
     """
     Recebe dados brutos (de formulário ou planilha), limpa, traduz, valida e prepara para desenho.
     """
@@ -117,7 +245,7 @@ def _prepare_data_for_dxf(raw_data: dict):
         return None, f"Dados insuficientes: 'part_name' ou 'shape' ausentes."
 
     # 3. Converte tipos de forma segura
-    def to_float(value, default=0.0):
+    def to_float(value, default: float = 0.0) -> float:
         if value is None: return default
         try:
             return float(str(value).replace(',', '.'))
@@ -137,14 +265,14 @@ def _prepare_data_for_dxf(raw_data: dict):
         'contour_color': int(to_float(params.get('contour_color', 7))),
         'holes_color': int(to_float(params.get('holes_color', 1))),
         'text_color': int(to_float(params.get('text_color', 2))),
-        'include_dims': str(params.get('include_dims', '')).lower() in ['true', 'on', '1', 'sim'],
+        'include_dims': str(params.get('include_dims', '')).lower() in _TRUTHY,
         'char_height': char_height,
         'dim_distance': max(15, char_height * 3),
         'text_insert_point': (0, -char_height * 2),
     }
     
     # 5. Lógica do bloco de texto
-    should_include_text = str(params.get('include_text_info', '')).lower() in ['true', 'on', '1', 'sim']
+    should_include_text = str(params.get('include_text_info', '')).lower() in _TRUTHY
     if should_include_text:
         try:
             shape = params.get('shape')
@@ -170,6 +298,216 @@ def _prepare_data_for_dxf(raw_data: dict):
             
     return params, None
 
+#==============================================================================
+# PREPARAÇÃO VETORIZADA PARA LOTES (PLANILHA)
+#==============================================================================
+def _warn_batch(message: str, items: list):
+    """Registra um único aviso para todas as ocorrências do lote, listando no máximo 20 delas."""
+    if items:
+        app.logger.warning(f"{message} ({len(items)}): {items[:20]}")
+
+def _normalize_key(key) -> str:
+    """Traduz um nome de coluna/campo para o padrão interno."""
+    clean_key = str(key).strip().lower().replace(' ', '_')
+    return COLUMN_MAPPING.get(clean_key, clean_key)
+
+def _to_numeric(series: pd.Series, default: float) -> pd.Series:
+    """Versão vetorizada de `to_float`: aceita vírgula decimal e usa `default` em valores inválidos."""
+    return pd.to_numeric(series.astype(str).str.replace(',', '.', regex=False), errors='coerce').fillna(default)
+
+def _prepare_frame(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.Index]:
+    """
+    Equivalente vetorizado de `_prepare_data_for_dxf` para um DataFrame inteiro.
+    Retorna o DataFrame de linhas válidas (com as colunas `styles` e `text_lines`) e o índice das linhas ignoradas.
+    """
+    # 1. Validação essencial
+    valid = pd.Series(True, index=df.index)
+    for key in ['part_name', 'shape']:
+        column = df[key] if key in df.columns else pd.Series(index=df.index, dtype=object)
+        valid &= column.notna() & (column.astype(str).str.strip() != '')
+    skipped = df.index[~valid]
+    if not valid.any():
+        return df.iloc[0:0], skipped
+    df = df.loc[valid].copy()
+
+    # 2. Converte tipos de forma segura
+    for key in ['width', 'height', 'diameter', 'material_thickness', 'material_density', 'part_quantity']:
+        if key in df.columns:
+            df[key] = _to_numeric(df[key], 1.0 if key == 'part_quantity' else 0.0)
+
+    def numeric_column(key, default):
+        return df[key] if key in df.columns else pd.Series(default, index=df.index, dtype=float)
+
+    def flag_column(key):
+        if key not in df.columns: return pd.Series(False, index=df.index)
+        return df[key].astype(str).str.lower().isin(_TRUTHY)
+
+    def color_column(key, default):
+        if key not in df.columns: return pd.Series(default, index=df.index, dtype=int)
+        return _to_numeric(df[key], 0.0).astype(int)
+
+    # 3. Cálculo de estilos dinâmicos
+    max_dim = np.maximum.reduce([numeric_column(k, 0.0).to_numpy(dtype=float) for k in ['width', 'height', 'diameter']])
+    max_dim = np.where(max_dim > 0, max_dim, 200)
+    char_height = np.clip(max_dim / 25, 5, 35)
+    dim_distance = np.maximum(15, char_height * 3)
+    df['styles'] = [
+        {
+            'contour_color': contour, 'holes_color': holes, 'text_color': text,
+            'include_dims': dims, 'char_height': height, 'dim_distance': distance,
+            'text_insert_point': (0, -height * 2),
+        }
+        for contour, holes, text, dims, height, distance in zip(
+            color_column('contour_color', 7), color_column('holes_color', 1), color_column('text_color', 2),
+            flag_column('include_dims'), char_height.tolist(), dim_distance.tolist(),
+        )
+    ]
+
+    # 4. Lógica do bloco de texto (pesos em NumPy; texto montado apenas nas linhas que pedem o bloco)
+    area_mm2 = np.where(df['shape'].to_numpy() == 'rectangle',
+                        numeric_column('width', 0.0).to_numpy() * numeric_column('height', 0.0).to_numpy(), 0.0)
+    thickness = numeric_column('material_thickness', 0.0).to_numpy()
+    volume_m3 = (area_mm2 / 1_000_000) * (thickness / 1_000)
+    unit_weight_kg = volume_m3 * numeric_column('material_density', 7850).to_numpy()
+    quantity = numeric_column('part_quantity', 1).to_numpy().astype(int)
+    total_weight_kg = unit_weight_kg * quantity
+
+    include_text = flag_column('include_text_info').to_numpy()
+    with_weight = include_text & (area_mm2 > 0)
+    without_weight = include_text & ~with_weight
+    names = df['part_name'].astype(str).str.upper()
+    text_lines: list[list[str] | None] = [None] * len(df)
+
+    for position in np.flatnonzero(without_weight):
+        text_lines[position] = [names.iat[position], "ERRO NO CALCULO DE PESO"]
+    _warn_batch("Peso não calculado (área da peça é zero)", df['part_name'][without_weight].tolist())
+
+    if with_weight.any():
+        sub = pd.DataFrame({
+            'thickness': thickness[with_weight], 'quantity': quantity[with_weight],
+            'unit_weight': unit_weight_kg[with_weight], 'total_weight': total_weight_kg[with_weight],
+        }, index=df.index[with_weight])
+        weight_lines = zip(
+            names[with_weight],
+            'Espessura: ' + sub['thickness'].map('{:.2f}'.format) + ' mm  (Qtd: ' + sub['quantity'].map('{:02d}'.format) + 'x)',
+            ('Peso Unitario: ' + sub['unit_weight'].map('{:.3f}'.format) + ' Kg').str.replace('.', ',', regex=False),
+            ('Peso Total: ' + sub['total_weight'].map('{:.3f}'.format) + ' Kg').str.replace('.', ',', regex=False),
+        )
+        for position, lines in zip(np.flatnonzero(with_weight), weight_lines):
+            text_lines[position] = list(lines)
+    df['text_lines'] = text_lines
+    return df, skipped
+
+def _cell_to_str(value):
+    """Converte uma célula do openpyxl para texto como o `pd.read_excel(dtype=str)` faria."""
+    if value is None: return None
+    if isinstance(value, float) and value.is_integer(): value = int(value)
+    return str(value)
+
+def _header_names(headers) -> list[str]:
+    """Nomes das colunas como o `pd.read_excel` os gera: `Unnamed: n` para os vazios e `.1`, `.2`, ... para os repetidos."""
+    names = [_cell_to_str(header) or f"Unnamed: {position}" for position, header in enumerate(headers)]
+    unnamed = [position for position, header in enumerate(headers) if not _cell_to_str(header)]
+    # Como no pandas, os nomes dados são resolvidos antes dos `Unnamed` e evitam nomes já presentes no cabeçalho
+    counts: dict[str, int] = {}
+    for position in [p for p in range(len(names)) if p not in unnamed] + unnamed:
+        name = original = names[position]
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[original] = count + 1
+            name = f"{original}.{count}"
+            count = count + 1 if name in names else counts.get(name, 0)
+        names[position] = name
+        counts[name] = count + 1
+    return names
+
+def _read_spreadsheet(file) -> pd.DataFrame:
+    """
+    Lê a planilha como texto, com o leitor `calamine` (Rust) quando o pandas o suporta e `python-calamine` está instalado.
+    Sem ele, percorre as linhas de arquivos .xlsx com o openpyxl em modo somente-leitura, sem a inferência de tipos do pandas;
+    os demais formatos (.xls) continuam com o `pd.read_excel`.
+    """
+    if _PANDAS_HAS_CALAMINE:
+        try:
+            return pd.read_excel(file, engine='calamine', dtype=str)
+        except ImportError:
+            file.seek(0)
+
+    if not str(file.filename).lower().endswith(('.xlsx', '.xlsm', '.xltx', '.xltm')):
+        return pd.read_excel(file, dtype=str)
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows, ())
+        records = [tuple(_cell_to_str(value) for value in row[:len(headers)]) for row in rows]
+    finally:
+        workbook.close()
+    return pd.DataFrame.from_records(records, columns=_header_names(headers))
+
+class _ZipStreamSink(io.RawIOBase):
+    """Destino sem `seek` para o `zipfile`: acumula os bytes escritos até serem drenados para a resposta HTTP."""
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _stream_zip(prepared_rows: list):
+    """Gera o ZIP do lote em pedaços, enviando cada DXF assim que ele é desenhado."""
+    sink = _ZipStreamSink()
+    failures = []
+    unique_rows, slots = _dedupe_rows(prepared_rows)
+    # Resultados guardados só enquanto alguma linha repetida ainda vai usá-los
+    pending = Counter(slots)
+    rendered = {}
+    try:
+        executor = _get_executor()
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+            results = executor.map(create_dxf_drawing, unique_rows, chunksize=16)
+            for prepared_data, slot in zip(prepared_rows, slots):
+                if slot not in rendered:
+                    rendered[slot] = next(results)
+                dxf_content, filename = rendered[slot]
+                pending[slot] -= 1
+                if not pending[slot]:
+                    del rendered[slot]
+                if not dxf_content:
+                    failures.append((prepared_data.get('part_name'), filename))
+                    continue
+
+                zf.writestr(filename, dxf_content)
+                yield sink.drain()
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            _discard_executor(executor)
+        # Depois do primeiro pedaço o status 200 já foi enviado; o cliente só recebe um ZIP incompleto
+        app.logger.exception(f"Erro ao gerar o ZIP do lote: {e}")
+        raise
+    _warn_batch("Falha ao desenhar peças", failures)
+    yield sink.drain()
+
+def _content_disposition(filename: str) -> str:
+    """
+    Cabeçalho de download como o do `send_file`: nomes fora do ASCII vão na forma da RFC 5987 (`filename*`),
+    acompanhados de uma versão ASCII (`filename`) para clientes que não a entendem.
+    """
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return f"attachment; filename=\"{simple}\"; filename*=UTF-8''{quote(filename, safe='!#$&+-.^_`|~')}"
+    return f'attachment; filename="{filename}"'
+
 #==============================================================================
 # ROTAS FLASK (CONTROLADORES)
 #==============================================================================
@@ -184,32 +522,35 @@ def generate_dxf_batch():
     if file.filename == '': return "Nenhum arquivo selecionado.", 400
 
     try:
-        df = pd.read_excel(file, dtype=str).dropna(how='all')
+        df = _read_spreadsheet(file).dropna(how='all')
     except Exception as e:
         app.logger.error(f"Erro ao ler a planilha: {e}")
         return "Erro ao processar o arquivo da planilha.", 500
 
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for index, row in df.iterrows():
-            raw_data = row.to_dict()
-            raw_data.update(request.form)
-
-            prepared_data, error = _prepare_data_for_dxf(raw_data)
-            if error:
-                app.logger.warning(f"Ignorando linha {index + 2}: {error}")
-                continue
-
-            dxf_content, filename = create_dxf_drawing(prepared_data)
-            if error or not dxf_content:
-                app.logger.warning(f"Falha ao desenhar a peça '{prepared_data.get('part_name')}': {filename or error}")
-                continue
-            
-            zf.writestr(filename, dxf_content)
+    # Traduz os cabeçalhos uma única vez e aplica as opções gerais do formulário como colunas constantes
+    df.columns = [_normalize_key(c) for c in df.columns]
+    if df.columns.has_duplicates:
+        df = df.loc[:, ~df.columns.duplicated(keep='last')]
+    form_defaults = {_normalize_key(k): v for k, v in request.form.to_dict(flat=True).items()}
+    for key, value in form_defaults.items():
+        df[key] = value
+
+    frame, skipped = _prepare_frame(df)
+    _warn_batch("Ignorando linhas sem 'part_name' ou 'shape'", [index + 2 for index in skipped])
+
+    columns = tuple(frame.columns)
+    prepared_rows = [dict(zip(columns, values)) for values in frame.itertuples(index=False, name=None)]
+
+    # Gera o primeiro pedaço antes de responder, para que falhas no pool ou na primeira peça ainda virem um erro 500
+    chunks = _stream_zip(prepared_rows)
+    try:
+        first_chunk = next(chunks)
+    except Exception:
+        return "Erro ao gerar os arquivos do lote.", 500
 
-    memory_file.seek(0)
     zip_filename = f"LOTE_DXF_{datetime.now():%Ym%d_%H%M%S}.zip"
-    return send_file(memory_file, mimetype='application/zip', as_attachment=True, download_name=zip_filename)
+    return Response(itertools.chain([first_chunk], chunks), mimetype='application/zip',
+                    headers={'Content-Disposition': _content_disposition(zip_filename)})
 
 @app.route('/generate-dxf', methods=['POST'])
 def generate_dxf_from_form():
@@ -220,9 +561,11 @@ def generate_dxf_from_form():
 
     dxf_content, filename = create_dxf_drawing(prepared_data)
     if not dxf_content:
+        app.logger.error(f"Erro no desenho do DXF '{prepared_data.get('part_name')}': {filename}")
         return f"Erro ao gerar o desenho: {filename}", 500
 
-    return send_file(io.BytesIO(dxf_content.encode()), as_attachment=True, download_name=filename, mimetype='application/dxf')
+    return Response(dxf_content, mimetype='application/dxf', headers={'Content-Disposition': _content_disposition(filename)})
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Servidor de desenvolvimento; em produção use `gunicorn -c gunicorn.conf.py app:app`
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG', '').lower() in _TRUTHY)
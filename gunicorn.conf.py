@@ -0,0 +1,13 @@
+# Configuração do gunicorn para produção: gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Cada worker já distribui o desenho dos lotes em um pool de processos do tamanho da CPU,
+# então poucos workers bastam; as threads atendem as requisições leves enquanto um lote é gerado.
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+threads = 4
+
+# Lotes grandes podem levar minutos
+timeout = 300